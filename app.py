@@ -1,250 +1,885 @@
 import os
-import json # For parsing JSON from request
-from flask import Flask, render_template, request, jsonify
+import json # Decodes candidate text; request and response bodies go through ORJSONProvider
+import asyncio
+import atexit
+import functools
+import threading
+import hashlib
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from types import MappingProxyType
+import orjson
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+from jinja2 import FileSystemBytecodeCache
 from dotenv import load_dotenv
-import google.generativeai as genai
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+from pydantic.alias_generators import to_camel
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Prompts and responses are logged at DEBUG; set LOG_LEVEL=DEBUG to see them.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+log = logging.getLogger(__name__)
+
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify() and request.get_json()."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+# Compiled templates are kept on disk (in a per-user temp directory), so a fresh
+# process doesn't re-parse them. Outside debug mode Flask also never re-checks them.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest' # Using a recent flash model
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "generativelanguage.googleapis.com")
+
+# --- Static instructions for each prompt family ---
+# These never change between requests, so they are given to the model once as its
+# system instruction. The per-request prompt only carries the form details, which
+# keeps the shared prefix of every request identical.
+LOCAL_BIZ_SYSTEM_INSTRUCTION = "\n".join([
+    "You are an expert social media manager specializing in engaging content for diverse local businesses.",
+    "Generate one social media caption from the business details you are given.",
+    "Instructions for the AI:",
+    "- Tailor the caption specifically to the nature of the given business type. Make it sound authentic for that type of business.",
+    "- Craft an engaging caption suitable for platforms like Instagram, Facebook, or X (formerly Twitter).",
+    "- If a product or service is mentioned, make it sound appealing and highlight its benefits.",
+    "- If an offer, event, or announcement is mentioned, ensure the details are clear and enticing.",
+    "- Naturally weave in the desired tone and call to action (if specified).",
+    "- The caption should be a complete thought.",
+    "- Do not include hashtags unless specifically asked for in the key message.",
+    "- Focus solely on generating the caption text. Do not add any introductory or concluding remarks, or labels like 'Caption:'."
+])
+
+ARTISAN_SYSTEM_INSTRUCTION = "\n".join([
+    "You are an expert copywriter specializing in crafting compelling and unique product descriptions for artisans and handmade sellers.",
+    "Generate one product description for the artisan product you are given.",
+    "Instructions for the AI:",
+    "- Write a description that is evocative and highlights the uniqueness of a handmade item in the given product category.",
+    "- Emphasize the craftsmanship, materials, and the story/inspiration if provided.",
+    "- Appeal to customers looking for unique, high-quality artisan goods.",
+    "- Keep the description suitable for an online shop listing (e.g., Etsy, personal website).",
+    "- The description should be a complete thought, well-structured for readability, and a paragraph or two in length.",
+    "- Focus solely on generating the product description text. Do not add any introductory or concluding remarks, or labels like 'Description:'."
+])
+
+# Upper bound on the variations one request may ask for. It caps candidate_count (Gemini
+# allows at most 8) and with it the output tokens a single request can cost.
+MAX_VARIATIONS = 5
+
+# Per-candidate output limits: a caption is short, a description runs a paragraph or two.
+LOCAL_BIZ_MAX_OUTPUT_TOKENS = 512
+ARTISAN_MAX_OUTPUT_TOKENS = 1024
+
+# Every candidate is one variation, constrained to a single JSON string, so line breaks
+# inside a caption or description never need to be guessed at.
+ITEM_RESPONSE_SCHEMA = {"type": "string"}
+# Streamed candidates are plain text, so their deltas can be shown as they arrive.
+STREAM_GENERATION_CONFIG = {"response_mime_type": "text/plain", "response_schema": None}
+
+# Generation and safety settings shared by both models. The models hold them as
+# defaults, so each request only passes what varies (the candidate count).
+GENERATION_CONFIG = {
+    "temperature": float(os.getenv("GEMINI_TEMPERATURE", "1.0")),
+    "top_p": float(os.getenv("GEMINI_TOP_P", "0.95")),
+    "response_mime_type": "application/json",
+    "response_schema": ITEM_RESPONSE_SCHEMA,
+}
+# Given by name so the SDK's enums aren't needed until a model is built.
+_safety_threshold = os.getenv("GEMINI_SAFETY_THRESHOLD", "BLOCK_MEDIUM_AND_ABOVE")
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_HARASSMENT": _safety_threshold,
+    "HARM_CATEGORY_HATE_SPEECH": _safety_threshold,
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": _safety_threshold,
+    "HARM_CATEGORY_DANGEROUS_CONTENT": _safety_threshold,
+}
+
+# System instruction and per-candidate output limit of each prompt family's model.
+MODEL_SETTINGS = {
+    'local_biz': (LOCAL_BIZ_SYSTEM_INSTRUCTION, LOCAL_BIZ_MAX_OUTPUT_TOKENS),
+    'artisan': (ARTISAN_SYSTEM_INSTRUCTION, ARTISAN_MAX_OUTPUT_TOKENS),
+}
+
+# --- Shared event loop for Gemini calls ---
+# Flask runs every async view to completion in its own short-lived event loop, but
+# the SDK's gRPC async client binds to the loop it is first used on. All Gemini
+# calls are therefore scheduled on one long-lived loop. This does not free WSGI
+# worker threads: each request still holds its thread for the whole Gemini round
+# trip, so concurrent requests are bounded by the server's thread count (see
+# wsgi.py). What the loop buys is the timeout below, one shared channel, and
+# cross-request work such as PromptBatcher.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+
+_gemini_loop = asyncio.new_event_loop()
+threading.Thread(target=_gemini_loop.run_forever, name="gemini-loop", daemon=True).start()
+
+
+async def run_on_gemini_loop(coro):
+    """Awaits coro on the shared Gemini loop, giving up after GEMINI_TIMEOUT_SECONDS."""
+    future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(coro, GEMINI_TIMEOUT_SECONDS), _gemini_loop)
+    return await asyncio.wrap_future(future)
+
+
+async def gemini_generate(model, prompt, **kwargs):
+    """Awaits model.generate_content_async on the shared Gemini loop."""
+    return await run_on_gemini_loop(model.generate_content_async(prompt, **kwargs))
+
+
+# --- Gemini channel lifecycle ---
+# All Gemini calls share the SDK's cached async client, i.e. one long-lived HTTP/2
+# connection per process. It is opened in the background as soon as the SDK is
+# configured, so the first call doesn't also pay for the TCP/TLS handshake, and
+# closed cleanly at exit.
+def _open_gemini_channel():
+    from google.generativeai import client as genai_client
+    try:
+        channel = genai_client.get_default_generative_async_client().transport.grpc_channel
+        channel.get_state(try_to_connect=True)
+    except Exception as e:
+        log.warning("Could not pre-open the Gemini channel: %s", e)
+
+
+async def _close_gemini_channel():
+    from google.generativeai import client as genai_client
+    await genai_client.get_default_generative_async_client().transport.close()
+
+
+async def _cancel_gemini_tasks():
+    # Long-lived tasks such as PromptBatcher's collectors would otherwise be destroyed pending.
+    tasks = asyncio.all_tasks() - {asyncio.current_task()}
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _shutdown_gemini_loop():
+    try:
+        asyncio.run_coroutine_threadsafe(_close_gemini_channel(), _gemini_loop).result(timeout=5)
+    except Exception as e:
+        log.debug("Error closing the Gemini channel: %s", e)
+    try:
+        asyncio.run_coroutine_threadsafe(_cancel_gemini_tasks(), _gemini_loop).result(timeout=5)
+    except Exception as e:
+        log.debug("Error cancelling Gemini tasks: %s", e)
+    _gemini_loop.call_soon_threadsafe(_gemini_loop.stop)
+
+
+# --- Gemini SDK and models (loaded on first use) ---
+# Importing google.generativeai pulls in gRPC and protobuf, which dominates cold
+# start. The SDK is imported, configured and its models built on the first request
+# that needs them, so a fresh process can serve the page straight away.
+_setup_lock = threading.RLock() # Reentrant: get_batcher -> get_model -> get_genai
+
+
+def _setup_once(function):
+    """Caches function like functools.cache, and also runs it at most once per argument
+    across threads. A second genai.configure() would reset the SDK's client cache and
+    orphan the pre-opened channel."""
+    cached = functools.cache(function)
+
+    @functools.wraps(function)
+    def wrapper(*args):
+        with _setup_lock:
+            return cached(*args)
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+@_setup_once
+def get_genai():
+    """Imports and configures the Gemini SDK once; returns the module, or None if it can't be configured."""
+    try:
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
+        import google.generativeai as genai
+        # The SDK's default transport is already gRPC (grpc_asyncio for the async client);
+        # forcing transport='grpc' here would hand the async client a sync channel.
+        genai.configure(api_key=gemini_api_key, client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    except Exception as e:
+        log.error("Error configuring Gemini API: %s", e)
+        return None
+    _gemini_loop.call_soon_threadsafe(_open_gemini_channel)
+    atexit.register(_shutdown_gemini_loop)
+    return genai
+
+
+@_setup_once
+def get_model(kind):
+    """Returns the GenerativeModel for a prompt family, built once; None if the API isn't configured."""
+    genai = get_genai()
+    if genai is None:
+        return None
+    system_instruction, max_output_tokens = MODEL_SETTINGS[kind]
+    return genai.GenerativeModel(
+        GEMINI_MODEL_NAME,
+        system_instruction=system_instruction,
+        generation_config={**GENERATION_CONFIG, "max_output_tokens": max_output_tokens},
+        safety_settings=SAFETY_SETTINGS,
+    )
+
+
+# --- Prompt cache ---
+class PromptCache:
+    """Two-tier cache of generated items for a prompt and variation count.
+
+    Tier 1 is an exact-match LRU keyed by a hash of the prompt. Tier 2, enabled by
+    passing semantic_threshold, embeds the prompt and serves the items of the most
+    similar cached prompt when their cosine similarity reaches the threshold.
+    """
+
+    def __init__(self, maxsize, semantic_threshold=None, semantic_size=256,
+                 embedding_model='models/text-embedding-004'):
+        self.maxsize = maxsize
+        self.semantic_threshold = semantic_threshold
+        self.semantic_size = semantic_size
+        self.embedding_model = embedding_model
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()
+        self._vectors = None # (semantic_size, dim) matrix of unit vectors, allocated on first store
+        self._semantic_entries = [] # (num_variations, items) for each row of _vectors
+        self._semantic_next = 0
+
+    @staticmethod
+    def _hash(prompt, num_variations):
+        return hashlib.blake2b(f"{num_variations}\n{prompt}".encode(), digest_size=16).hexdigest()
+
+    async def _embed(self, prompt):
+        import numpy as np
+        try:
+            result = await run_on_gemini_loop(
+                get_genai().embed_content_async(model=self.embedding_model, content=prompt, task_type='semantic_similarity')
+            )
+        except Exception as e:
+            log.warning("Prompt embedding failed, using exact-match cache only: %s", e)
+            return None
+        vector = np.asarray(result['embedding'], dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def lookup(self, prompt, num_variations):
+        """Returns (items, key): items is None on a miss, and key should be passed to store()."""
+        key = (self._hash(prompt, num_variations), None)
+        with self._lock:
+            if key[0] in self._exact:
+                self._exact.move_to_end(key[0])
+                return self._exact[key[0]], key
+        if self.semantic_threshold is None:
+            return None, key
+
+        vector = await self._embed(prompt)
+        key = (key[0], vector)
+        if vector is None:
+            return None, key
+        with self._lock:
+            if self._vectors is None:
+                return None, key
+            similarities = self._vectors[:len(self._semantic_entries)] @ vector
+            for row in similarities.argsort()[::-1]:
+                if similarities[row] < self.semantic_threshold:
+                    break
+                cached_variations, items = self._semantic_entries[row]
+                if cached_variations == num_variations:
+                    return items, key
+        return None, key
+
+    def store(self, key, num_variations, items):
+        """Caches items under the key returned by lookup()."""
+        prompt_hash, vector = key
+        with self._lock:
+            self._exact[prompt_hash] = items
+            self._exact.move_to_end(prompt_hash)
+            while len(self._exact) > self.maxsize:
+                self._exact.popitem(last=False)
+            if vector is None:
+                return
+            if self._vectors is None:
+                import numpy as np
+                self._vectors = np.zeros((self.semantic_size, vector.shape[0]), dtype=np.float32)
+            row = self._semantic_next
+            self._vectors[row] = vector
+            if row < len(self._semantic_entries):
+                self._semantic_entries[row] = (num_variations, items)
+            else:
+                self._semantic_entries.append((num_variations, items))
+            self._semantic_next = (row + 1) % self.semantic_size
+
+
+# Set SEMANTIC_CACHE_THRESHOLD (e.g. 0.95) to also reuse results for near-duplicate prompts.
+# Each prompt family has its own cache, so a near-duplicate prompt can never be answered
+# with the other family's items, however loose the threshold.
+semantic_cache_threshold = os.getenv("SEMANTIC_CACHE_THRESHOLD")
+prompt_caches = {
+    kind: PromptCache(
+        maxsize=int(os.getenv("PROMPT_CACHE_SIZE", "1024")),
+        semantic_threshold=float(semantic_cache_threshold) if semantic_cache_threshold else None,
+    )
+    for kind in MODEL_SETTINGS
+}
+
+
+def _nonempty_stripped(values):
+    """Strips each string in values once and keeps the non-empty ones; anything that isn't a string is dropped."""
+    return list(filter(None, (value.strip() for value in values if isinstance(value, str))))
+
+
+def parse_candidate_items(response):
+    """Returns one item per candidate (its JSON string, stripped), skipping blocked, malformed or empty candidates."""
+    items = []
+    for candidate in response.candidates:
+        if not candidate.content.parts:
+            continue
+        try:
+            value = json.loads(candidate.content.parts[0].text)
+        except ValueError:
+            log.warning("Skipping candidate with malformed JSON: %r", candidate.content.parts[0].text)
+            continue
+        if isinstance(value, list):
+            # Off-schema, but still one variation: keep its paragraphs together.
+            value = "\n\n".join(_nonempty_stripped(value))
+        items.extend(_nonempty_stripped([value]))
+    return items
+
+
+_SAFE_PROBABILITIES = frozenset({"NEGLIGIBLE", "LOW"})
+
+
+def _safety_error(response, noun):
+    """Explains an empty generation: names the blocking safety category if the prompt feedback shows one."""
+    feedback = getattr(response, 'prompt_feedback', None)
+    if feedback:
+        blocked = next((
+            rating for rating in feedback.safety_ratings
+            if rating.category.name != "HARM_CATEGORY_UNSPECIFIED" and rating.probability.name not in _SAFE_PROBABILITIES
+        ), None)
+        if blocked is not None:
+            return f"Content generation blocked due to safety concerns ({blocked.category.name}). Please revise your input."
+    return f"The AI could not generate {noun}. Please try rephrasing or adding more detail."
+
+
+# --- Cross-request prompt batching (optional) ---
+# With PROMPT_BATCH_SIZE above 1, prompts for the same model that arrive within
+# PROMPT_BATCH_WAIT_MS of each other are sent to Gemini as one tagged prompt, and the
+# reply (a JSON array with one array of variations per tag) is split back per request.
+# Off by default: it trades a little latency and per-request isolation for fewer calls.
+# Streamed requests (what the page sends) are never batched; see Streaming below.
+BATCH_RESPONSE_SCHEMA = {"type": "array", "items": {"type": "array", "items": ITEM_RESPONSE_SCHEMA}}
+
+
+class PromptBatcher:
+    """Coalesces concurrent prompts for one model into a single Gemini call.
+
+    All queue handling runs on the shared Gemini loop; submit() can be awaited from any
+    request's loop.
+    """
+
+    def __init__(self, model, max_output_tokens, max_batch=8, max_wait=0.1):
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = None # Created on the Gemini loop by the first submit()
+        self._collector = None
+        self._answering = set() # The loop only holds weak references to tasks
+
+    async def submit(self, prompt, num_variations):
+        """Returns the generated items for prompt once its batch has been answered."""
+        return await run_on_gemini_loop(self._enqueue(prompt, num_variations))
+
+    def close(self):
+        """Stops the batch collector; call it before dropping a batcher that has been used."""
+        if self._collector is not None:
+            _gemini_loop.call_soon_threadsafe(self._collector.cancel)
+
+    async def _enqueue(self, prompt, num_variations):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect_batches())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, num_variations, future))
+        return await future
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._answer(batch))
+            self._answering.add(task)
+            task.add_done_callback(self._answering.discard)
+
+    async def _answer(self, batch):
+        try:
+            if len(batch) == 1:
+                prompt, num_variations, _ = batch[0]
+                # Each caller only times out its own future, so the shared call needs its own limit.
+                response = await asyncio.wait_for(self.model.generate_content_async(
+                    prompt, generation_config={"candidate_count": num_variations}
+                ), GEMINI_TIMEOUT_SECONDS)
+                results = [parse_candidate_items(response)]
+            else:
+                results = await self._generate_batched(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, num_variations, future), items in zip(batch, results):
+            if not future.done():
+                future.set_result(items[:num_variations])
+
+    async def _generate_batched(self, batch):
+        sections = [
+            f"[{index}] (write {num_variations} distinct variation(s))\n{prompt}"
+            for index, (prompt, num_variations, _) in enumerate(batch, start=1)
+        ]
+        batched_prompt = "\n\n".join([
+            f"You are given {len(batch)} separate requests, tagged [1] to [{len(batch)}]. Handle each one independently, following your instructions.",
+            f"Respond with a JSON array of {len(batch)} arrays: array i holds the variations for request [i], one complete string per variation.",
+            *sections,
+        ])
+        total_variations = sum(num_variations for _, num_variations, _ in batch)
+        response = await asyncio.wait_for(self.model.generate_content_async(batched_prompt, generation_config={
+            "candidate_count": 1,
+            "response_schema": BATCH_RESPONSE_SCHEMA,
+            "max_output_tokens": min(self.max_output_tokens * total_variations, 8192),
+        }), GEMINI_TIMEOUT_SECONDS)
+        results = [[] for _ in batch]
+        if response.candidates and response.candidates[0].content.parts:
+            try:
+                replies = json.loads(response.candidates[0].content.parts[0].text)
+            except ValueError:
+                log.warning("Batched Gemini reply was not valid JSON; failing %d requests", len(batch))
+                replies = []
+            for index, values in enumerate(replies[:len(batch)]):
+                if isinstance(values, list):
+                    results[index] = _nonempty_stripped(values)
+        log.debug("Answered %d batched prompts in one Gemini call", len(batch))
+        return results
+
+
+PROMPT_BATCH_SIZE = int(os.getenv("PROMPT_BATCH_SIZE", "1"))
+PROMPT_BATCH_WAIT_MS = int(os.getenv("PROMPT_BATCH_WAIT_MS", "100"))
+
+
+@_setup_once
+def get_batcher(kind):
+    """Returns the PromptBatcher for a prompt family's model, or None when batching is off or the API isn't configured."""
+    if PROMPT_BATCH_SIZE <= 1 or get_model(kind) is None:
+        return None
+    return PromptBatcher(get_model(kind), MODEL_SETTINGS[kind][1], PROMPT_BATCH_SIZE, PROMPT_BATCH_WAIT_MS / 1000)
+
+
+# --- Request schemas ---
+def _clamp_variations(raw, default, lo=1, hi=MAX_VARIATIONS):
+    """Parses a requested variation count and clamps it to [lo, hi]; anything that isn't an integer gets the default."""
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        return default
+    return max(lo, min(hi, value))
+
+
+class FormRequest(BaseModel):
+    """Base for the JSON bodies posted by the page's forms: camelCase keys, unknown keys ignored."""
+    model_config = ConfigDict(alias_generator=to_camel, populate_by_name=True)
+
+    @field_validator('num_variations', mode='before', check_fields=False)
+    @classmethod
+    def _bound_num_variations(cls, raw):
+        return _clamp_variations(raw, cls.model_fields['num_variations'].default)
+
+
+class LocalBizRequest(FormRequest):
+    business_name: str | None = None
+    business_type: str = 'local business'
+    post_type: str = 'general announcement'
+    key_message: str = 'something exciting!'
+    tone: str = 'friendly & casual'
+    call_to_action: str = 'no specific cta'
+    include_emojis: bool = False # The checkbox posts 'on' when ticked
+    num_variations: int = 3
+
+
+class ArtisanRequest(FormRequest):
+    creator_name: str | None = None
+    product_name: str = 'this unique item' # Required in form
+    product_category: str = 'handmade product' # Required in form
+    key_materials: str = 'quality materials' # Required in form
+    creation_process: str | None = None
+    inspiration: str | None = None
+    unique_selling_points: str = 'it is special' # Required in form
+    artisan_tone: str = 'story_driven_evocative'
+    num_variations: int = 2 # Default from HTML form for artisan
+
+
+def describe_validation_error(error):
+    """Turns a pydantic ValidationError into a single readable message for the page."""
+    problems = "; ".join(f"{'.'.join(map(str, e['loc'])) or 'body'}: {e['msg']}" for e in error.errors())
+    return f"Invalid input: {problems}"
+
+
+# --- Prompt templates ---
+# Built once at import; the constructors below only fill in the form fields.
+_LOCAL_BIZ_HEAD = "\n".join([
+    "The business type is: '{business_type}'.",
+    "The desired tone for the caption is '{tone}'.",
+    "The purpose of the post is: '{post_type}'.",
+    "Key message/details to include: '{key_message}'.",
+])
+_LOCAL_BIZ_NAME = "The business name is '{}'."
+_LOCAL_BIZ_CTA = "Include a call to action like: '{}'."
+_CTA_TEXT = MappingProxyType({
+    "visit_us": "Visit Us Today!",
+    "shop_now_online": "Shop Now/Order Online!",
+    "book_appointment_now": "Book Your Appointment Now!",
+    "learn_more": "Learn More (link in bio/DM us)!",
+    "tag_friend": "Tag a Friend Who Needs This!",
+    "contact_us": "Contact Us for Details!"
+})
+_LOCAL_BIZ_CUSTOM_CTA = "The user wants a custom call to action, infer it from the key message or make a general one if not clear."
+_LOCAL_BIZ_EMOJIS = "Please include relevant emojis to make the caption engaging."
+_LOCAL_BIZ_NO_EMOJIS = "Do not use any emojis in the caption."
+
+_ARTISAN_HEAD = "\n".join([
+    "The product is: '{product_name}', a type of '{product_category}'.",
+    "It is made primarily from: '{key_materials}'.",
+    "The desired tone for the description is '{artisan_tone}'.",
+    "Key unique selling points and customer benefits are: '{unique_selling_points}'.",
+])
+_ARTISAN_CREATOR = "The creator/brand name is '{}'."
+_ARTISAN_PROCESS = "Highlights of the creation process/technique: '{}'."
+_ARTISAN_INSPIRATION = "The inspiration or story behind the product is: '{}'."
 
-# Configure the Google Gemini API
-try:
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
-    genai.configure(api_key=gemini_api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash-latest') # Using a recent flash model
-except Exception as e:
-    print(f"Error configuring Gemini API: {e}")
-    model = None
 
 # --- Helper function to construct the prompt for Local Businesses ---
-def construct_local_biz_caption_prompt(data):
-    """Constructs a detailed prompt for the Gemini API based on local business form data."""
-    business_name = data.get('businessName') or "Our business"
-    business_type = data.get('businessType', 'local business')
-    
-    post_type = data.get('postType', 'general announcement').replace('_', ' ')
-    key_message = data.get('keyMessage', 'something exciting!')
-    tone = data.get('tone', 'friendly & casual').replace('_', ' ')
-    call_to_action = data.get('callToAction', 'no specific cta')
-    include_emojis = data.get('includeEmojis') == 'on'
-    # Ensure numVariations is correctly fetched for this form
-    num_variations = int(data.get('numVariations', 3))
-
-
-    prompt_lines = [
-        f"You are an expert social media manager specializing in engaging content for diverse local businesses.",
-        f"Generate {num_variations} distinct social media caption(s).",
-        f"The business type is: '{business_type}'.",
-        f"The desired tone for the caption(s) is '{tone}'.",
-        f"The purpose of the post is: '{post_type}'.",
-        f"Key message/details to include: '{key_message}'.",
-    ]
-
-    if business_name != "Our business":
-        prompt_lines.append(f"The business name is '{business_name}'.")
+def construct_local_biz_caption_prompt(form):
+    """Constructs the per-request prompt for a LocalBizRequest; the instructions live in LOCAL_BIZ_SYSTEM_INSTRUCTION."""
+    prompt_lines = [_LOCAL_BIZ_HEAD.format(
+        business_type=form.business_type,
+        tone=form.tone.replace('_', ' '),
+        post_type=form.post_type.replace('_', ' '),
+        key_message=form.key_message,
+    )]
+
+    if form.business_name and form.business_name != "Our business":
+        prompt_lines.append(_LOCAL_BIZ_NAME.format(form.business_name))
 
+    call_to_action = form.call_to_action
     if call_to_action != "no specific cta" and call_to_action != "custom_cta":
-        cta_text_map = {
-            "visit_us": "Visit Us Today!",
-            "shop_now_online": "Shop Now/Order Online!",
-            "book_appointment_now": "Book Your Appointment Now!",
-            "learn_more": "Learn More (link in bio/DM us)!",
-            "tag_friend": "Tag a Friend Who Needs This!",
-            "contact_us": "Contact Us for Details!"
-        }
-        cta_text = cta_text_map.get(call_to_action, call_to_action.replace('_', ' ').title() + "!")
-        prompt_lines.append(f"Include a call to action like: '{cta_text}'.")
+        cta_text = _CTA_TEXT.get(call_to_action) or (call_to_action.replace('_', ' ').title() + "!")
+        prompt_lines.append(_LOCAL_BIZ_CTA.format(cta_text))
     elif call_to_action == "custom_cta":
-        prompt_lines.append("The user wants a custom call to action, infer it from the key message or make a general one if not clear.")
-
-    if include_emojis:
-        prompt_lines.append("Please include relevant emojis to make the caption(s) engaging.")
-    else:
-        prompt_lines.append("Do not use any emojis in the caption(s).")
-
-    prompt_lines.extend([
-        "Instructions for the AI:",
-        f"- Tailor the caption(s) specifically to the nature of a '{business_type}'. Make it sound authentic for that type of business.",
-        "- Craft engaging captions suitable for platforms like Instagram, Facebook, or X (formerly Twitter).",
-        "- If a product or service is mentioned, make it sound appealing and highlight its benefits.",
-        "- If an offer, event, or announcement is mentioned, ensure the details are clear and enticing.",
-        "- Naturally weave in the desired tone and call to action (if specified).",
-        "- Provide distinct caption options. Each caption should be a complete thought.",
-        "- Do not include hashtags unless specifically asked for in the key message.",
-        "- Focus solely on generating the caption text. Do not add any introductory or concluding remarks, or labels like 'Caption 1:'.",
-        "- Each caption should be on a new line if multiple are generated."
-    ])
+        prompt_lines.append(_LOCAL_BIZ_CUSTOM_CTA)
+
+    prompt_lines.append(_LOCAL_BIZ_EMOJIS if form.include_emojis else _LOCAL_BIZ_NO_EMOJIS)
     return "\n".join(prompt_lines)
 
 
 # --- NEW: Helper function to construct the prompt for Artisan Product Descriptions ---
-def construct_artisan_description_prompt(data):
-    """Constructs a detailed prompt for the Gemini API for artisan product descriptions."""
-    creator_name = data.get('creatorName')
-    product_name = data.get('productName', 'this unique item') # Required in form
-    product_category = data.get('productCategory', 'handmade product') # Required in form
-    key_materials = data.get('keyMaterials', 'quality materials') # Required in form
-    creation_process = data.get('creationProcess')
-    inspiration = data.get('inspiration')
-    unique_selling_points = data.get('uniqueSellingPoints', 'it is special') # Required in form
-    artisan_tone = data.get('artisanTone', 'story_driven_evocative').replace('_', ' ')
-    # Ensure numVariations is correctly fetched for this form (name attribute is 'numVariations')
-    num_variations = int(data.get('numVariations', 2)) # Default to 2 as in HTML
-
-    prompt_lines = [
-        f"You are an expert copywriter specializing in crafting compelling and unique product descriptions for artisans and handmade sellers.",
-        f"Generate {num_variations} distinct product description(s) for an artisan product.",
-        f"The product is: '{product_name}', a type of '{product_category}'.",
-        f"It is made primarily from: '{key_materials}'.",
-        f"The desired tone for the description(s) is '{artisan_tone}'.",
-        f"Key unique selling points and customer benefits are: '{unique_selling_points}'.",
-    ]
-
-    if creator_name:
-        prompt_lines.append(f"The creator/brand name is '{creator_name}'.")
-    if creation_process:
-        prompt_lines.append(f"Highlights of the creation process/technique: '{creation_process}'.")
-    if inspiration:
-        prompt_lines.append(f"The inspiration or story behind the product is: '{inspiration}'.")
-
-    prompt_lines.extend([
-        "Instructions for the AI:",
-        f"- Write descriptions that are evocative and highlight the uniqueness of a handmade '{product_category}'.",
-        "- Emphasize the craftsmanship, materials, and the story/inspiration if provided.",
-        "- Appeal to customers looking for unique, high-quality artisan goods.",
-        "- Keep the descriptions suitable for an online shop listing (e.g., Etsy, personal website).",
-        "- Provide distinct description options. Each description should be a complete thought and well-structured for readability.",
-        "- Focus solely on generating the product description text. Do not add any introductory or concluding remarks, or labels like 'Description 1:'.",
-        "- Each description should be on a new line if multiple are generated, and be a paragraph or two in length."
-    ])
-    return "\n".join(prompt_lines)
+def construct_artisan_description_prompt(form):
+    """Constructs the per-request prompt for an ArtisanRequest; the instructions live in ARTISAN_SYSTEM_INSTRUCTION."""
+    prompt_lines = [_ARTISAN_HEAD.format(
+        product_name=form.product_name,
+        product_category=form.product_category,
+        key_materials=form.key_materials,
+        artisan_tone=form.artisan_tone.replace('_', ' '),
+        unique_selling_points=form.unique_selling_points,
+    )]
 
+    if form.creator_name:
+        prompt_lines.append(_ARTISAN_CREATOR.format(form.creator_name))
+    if form.creation_process:
+        prompt_lines.append(_ARTISAN_PROCESS.format(form.creation_process))
+    if form.inspiration:
+        prompt_lines.append(_ARTISAN_INSPIRATION.format(form.inspiration))
 
-# --- Flask Routes ---
+    return "\n".join(prompt_lines)
 
-@app.route('/')
-def index():
-    """Serves the main HTML page."""
-    return render_template('index.html')
 
-@app.route('/generate_local_biz_captions', methods=['POST'])
-def generate_local_biz_captions():
-    """Handles form submission for local businesses, interacts with Gemini API, and returns generated captions."""
+# --- Generation ---
+async def run_local_biz_generation(form):
+    """Generates local business captions with the Gemini API; returns (response payload, HTTP status)."""
+    model = get_model('local_biz')
     if not model:
-        return jsonify({"error": "Gemini API model not configured. Please check server logs."}), 500
+        return {"error": "Gemini API model not configured. Please check server logs."}, 500
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided in request."}), 400
-        prompt = construct_local_biz_caption_prompt(data)
-        print("---- Constructed Local Biz Prompt ----")
-        print(prompt)
-        print("------------------------------------")
-        response = model.generate_content(prompt)
-        generated_text = ""
-        captions = []
-        if response.candidates and response.candidates[0].content.parts:
-            generated_text = response.candidates[0].content.parts[0].text
-            captions = [caption.strip() for caption in generated_text.split('\n') if caption.strip()]
-        elif hasattr(response, 'text') and response.text: # Fallback
-            generated_text = response.text
-            captions = [caption.strip() for caption in generated_text.split('\n') if caption.strip()]
-        
-        print("---- Gemini API Response Text (Local Biz) ----")
-        print(generated_text)
-        print("--------------------------------------------")
-        print("---- Parsed Captions (Local Biz) ----")
-        print(captions)
-        print("-------------------------------------")
-
-        num_variations_requested = int(data.get('numVariations', 3))
-        final_captions = []
-        if captions:
-            if len(captions) >= num_variations_requested:
-                final_captions = captions[:num_variations_requested]
-            else:
-                final_captions = captions 
-        
+        prompt = construct_local_biz_caption_prompt(form)
+        log.debug("Local biz prompt:\n%s", prompt)
+        num_variations_requested = form.num_variations
+        cached_captions, cache_key = await prompt_caches['local_biz'].lookup(prompt, num_variations_requested)
+        if cached_captions is not None:
+            return {"captions": cached_captions}, 200
+        batcher = get_batcher('local_biz')
+        if batcher:
+            response = None
+            captions = await batcher.submit(prompt, num_variations_requested)
+        else:
+            # One candidate per variation: Gemini decodes them together in a single request.
+            response = await gemini_generate(
+                model, prompt, generation_config={"candidate_count": num_variations_requested}
+            )
+            captions = parse_candidate_items(response)
+        final_captions = captions[:num_variations_requested]
+        log.debug("Local biz captions: %s", final_captions)
         if not final_captions:
-            error_message = "The AI could not generate captions. Please try rephrasing or adding more detail."
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                for rating in response.prompt_feedback.safety_ratings:
-                    if rating.category.name != "HARM_CATEGORY_UNSPECIFIED" and rating.probability.name not in ["NEGLIGIBLE", "LOW"]:
-                        error_message = f"Content generation blocked due to safety concerns ({rating.category.name}). Please revise your input."
-                        break
-            return jsonify({"error": error_message}), 400
-        return jsonify({"captions": final_captions})
+            return {"error": _safety_error(response, "captions")}, 400
+        prompt_caches['local_biz'].store(cache_key, num_variations_requested, final_captions)
+        return {"captions": final_captions}, 200
+    except asyncio.TimeoutError:
+        log.warning("Timed out waiting for Gemini during local biz caption generation")
+        return {"error": "The AI took too long to respond. Please try again."}, 504
     except Exception as e:
-        print(f"Error during local biz caption generation: {e}")
-        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+        log.exception("Error during local biz caption generation")
+        return {"error": f"An internal error occurred: {str(e)}"}, 500
 
 
-# --- NEW: Flask Route for Artisan Product Descriptions ---
-@app.route('/generate_artisan_description', methods=['POST'])
-def generate_artisan_description():
-    """Handles form submission for artisan product descriptions, interacts with Gemini API, and returns generated descriptions."""
+async def run_artisan_generation(form):
+    """Generates artisan product descriptions with the Gemini API; returns (response payload, HTTP status)."""
+    model = get_model('artisan')
     if not model:
-        return jsonify({"error": "Gemini API model not configured. Please check server logs."}), 500
+        return {"error": "Gemini API model not configured. Please check server logs."}, 500
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data provided in request."}), 400
-        
-        prompt = construct_artisan_description_prompt(data)
-        print("---- Constructed Artisan Prompt ----") # For debugging
-        print(prompt)
-        print("----------------------------------")
-
-        response = model.generate_content(prompt)
-        generated_text = ""
-        descriptions = []
+        prompt = construct_artisan_description_prompt(form)
+        log.debug("Artisan prompt:\n%s", prompt)
 
-        if response.candidates and response.candidates[0].content.parts:
-            generated_text = response.candidates[0].content.parts[0].text
-            # Product descriptions might be longer and could be paragraph-based.
-            # Splitting by double newline might be better if AI formats them as paragraphs.
-            # For now, sticking to single newline split, assuming AI gives distinct descriptions on new lines.
-            descriptions = [desc.strip() for desc in generated_text.split('\n') if desc.strip()]
-        elif hasattr(response, 'text') and response.text: # Fallback
-            generated_text = response.text
-            descriptions = [desc.strip() for desc in generated_text.split('\n') if desc.strip()]
-
-        print("---- Gemini API Response Text (Artisan) ----")
-        print(generated_text)
-        print("--------------------------------------------")
-        print("---- Parsed Descriptions (Artisan) ----")
-        print(descriptions)
-        print("---------------------------------------")
-
-        num_variations_requested = int(data.get('numVariations', 2)) # Default from HTML form for artisan
-        final_descriptions = []
-
-        if descriptions:
-            if len(descriptions) >= num_variations_requested:
-                final_descriptions = descriptions[:num_variations_requested]
-            else: # AI gave fewer than requested
-                final_descriptions = descriptions
-        
+        num_variations_requested = form.num_variations
+        cached_descriptions, cache_key = await prompt_caches['artisan'].lookup(prompt, num_variations_requested)
+        if cached_descriptions is not None:
+            return {"descriptions": cached_descriptions}, 200
+        batcher = get_batcher('artisan')
+        if batcher:
+            response = None
+            descriptions = await batcher.submit(prompt, num_variations_requested)
+        else:
+            # Each candidate is one complete description, so multi-paragraph output stays intact.
+            response = await gemini_generate(
+                model, prompt, generation_config={"candidate_count": num_variations_requested}
+            )
+            descriptions = parse_candidate_items(response)
+        final_descriptions = descriptions[:num_variations_requested] # The AI may give fewer than requested
+        log.debug("Artisan descriptions: %s", final_descriptions)
         if not final_descriptions:
-            error_message = "The AI could not generate descriptions. Please try rephrasing or adding more detail."
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                for rating in response.prompt_feedback.safety_ratings:
-                    if rating.category.name != "HARM_CATEGORY_UNSPECIFIED" and rating.probability.name not in ["NEGLIGIBLE", "LOW"]:
-                        error_message = f"Content generation blocked due to safety concerns ({rating.category.name}). Please revise your input."
-                        break
-            return jsonify({"error": error_message}), 400
-        
+            return {"error": _safety_error(response, "descriptions")}, 400
+
+        prompt_caches['artisan'].store(cache_key, num_variations_requested, final_descriptions)
         # IMPORTANT: The JavaScript expects a key named "descriptions" for this endpoint
-        return jsonify({"descriptions": final_descriptions})
+        return {"descriptions": final_descriptions}, 200
 
+    except asyncio.TimeoutError:
+        log.warning("Timed out waiting for Gemini during artisan description generation")
+        return {"error": "The AI took too long to respond. Please try again."}, 504
     except Exception as e:
-        print(f"Error during artisan description generation: {e}")
-        return jsonify({"error": f"An internal error occurred: {str(e)}"}), 500
+        log.exception("Error during artisan description generation")
+        return {"error": f"An internal error occurred: {str(e)}"}, 500
+
+
+# --- Streaming ---
+# Unless background jobs are enabled, clients that send `Accept: text/event-stream` get
+# each candidate's text as Gemini produces it, as server-sent events: {"index", "delta"} per chunk, then {"done": true},
+# or {"error"} if generation fails.
+# The page always asks for a stream, so unless background jobs are on, browser requests
+# take this path. Streaming uses the SDK's sync client and generate_content(stream=True)
+# in the request thread, so it bypasses the JSON-mode candidates, PromptBatcher and the
+# pre-opened async channel; those serve API clients that accept plain JSON, and jobs.
+STREAM_SOURCES = {
+    'local_biz': lambda form: (get_model('local_biz'), construct_local_biz_caption_prompt(form), form.num_variations, "captions"),
+    'artisan': lambda form: (get_model('artisan'), construct_artisan_description_prompt(form), form.num_variations, "descriptions"),
+}
+
+
+def _sse(message):
+    return b"data: " + orjson.dumps(message) + b"\n\n"
+
+
+def stream_candidates(model, prompt, num_variations, cache, cache_key, noun):
+    """Yields server-sent events with the text of each candidate as it streams in, then caches the finished items in cache."""
+    texts = {}
+    try:
+        response = model.generate_content(
+            prompt,
+            generation_config={"candidate_count": num_variations, **STREAM_GENERATION_CONFIG},
+            stream=True,
+            request_options={"timeout": GEMINI_TIMEOUT_SECONDS},
+        )
+        for chunk in response:
+            for candidate in chunk.candidates:
+                delta = "".join(part.text for part in candidate.content.parts)
+                if delta:
+                    texts[candidate.index] = texts.get(candidate.index, "") + delta
+                    yield _sse({"index": candidate.index, "delta": delta})
+    except Exception:
+        log.exception("Error while streaming %s", noun)
+        yield _sse({"error": "An internal error occurred while generating. Please try again."})
+        return
+
+    items = _nonempty_stripped(text for _, text in sorted(texts.items()))
+    log.debug("Streamed %s: %s", noun, items)
+    if not items:
+        yield _sse({"error": _safety_error(response, noun)})
+        return
+    cache.store(cache_key, num_variations, items)
+    yield _sse({"done": True})
+
+
+async def stream_generation(kind, form):
+    """Answers a generation request with a text/event-stream response."""
+    model, prompt, num_variations, noun = STREAM_SOURCES[kind](form)
+    if not model:
+        return jsonify({"error": "Gemini API model not configured. Please check server logs."}), 500
+    cache = prompt_caches[kind]
+    cached_items, cache_key = await cache.lookup(prompt, num_variations)
+    if cached_items is not None:
+        events = [_sse({"index": index, "delta": item}) for index, item in enumerate(cached_items)]
+        return Response(events + [_sse({"done": True})], mimetype='text/event-stream')
+    return Response(stream_candidates(model, prompt, num_variations, cache, cache_key, noun), mimetype='text/event-stream')
+
+
+# --- Background jobs (optional) ---
+# With GENERATION_BACKGROUND_JOBS=1 and REDIS_URL set, the generation routes enqueue a
+# Celery job and answer 202 with its id; the page then polls /result/<job_id>. Only
+# enable this with the Procfile's worker process scaled up, and keep that process at 0
+# otherwise (worker.py refuses to start without the flag). Run the worker with
+# `celery -A worker.celery worker --pool=threads`: the shared Gemini loop thread and gRPC
+# channel would not survive the default prefork pool, and the work is I/O-bound anyway.
+# Otherwise generation happens in the request.
+GENERATION_RUNNERS = {
+    'local_biz': run_local_biz_generation,
+    'artisan': run_artisan_generation,
+}
+REQUEST_SCHEMAS = {
+    'local_biz': LocalBizRequest,
+    'artisan': ArtisanRequest,
+}
+
+REDIS_URL = os.getenv("REDIS_URL")
+# A job still pending after this long is reported as failed (and a worker that only
+# picks it up later discards it), so the page never polls forever.
+JOB_TIMEOUT_SECONDS = int(os.getenv("JOB_TIMEOUT_SECONDS", "120"))
+
+if os.getenv("GENERATION_BACKGROUND_JOBS") == "1" and REDIS_URL:
+    from celery import Celery # Only imported when background jobs are enabled
+    celery = Celery('app', broker=REDIS_URL, backend=REDIS_URL)
+else:
+    if os.getenv("GENERATION_BACKGROUND_JOBS") == "1":
+        log.error("GENERATION_BACKGROUND_JOBS is set but REDIS_URL is not; generating in the request instead.")
+    celery = None
+
+
+def generate_content_job(data, kind):
+    """Runs one generation in a worker; returns [response payload, HTTP status]."""
+    return asyncio.run(GENERATION_RUNNERS[kind](REQUEST_SCHEMAS[kind].model_validate(data)))
+
+
+if celery:
+    generate_content_task = celery.task(name='generate_content')(generate_content_job)
+
+
+def _new_job_id():
+    """Returns a job id that records its enqueue time, so /result can tell a lost job from a slow one."""
+    return f"{int(time.time())}-{uuid.uuid4().hex}"
+
+
+def _job_age(job_id):
+    """Seconds since the job was enqueued, or None if job_id wasn't made by _new_job_id()."""
+    enqueued_at, _, _ = job_id.partition('-')
+    # isdigit() alone also admits characters like '²' that int() rejects.
+    if not (enqueued_at.isascii() and enqueued_at.isdecimal()):
+        return None
+    return time.time() - int(enqueued_at)
+
+
+async def respond_with_generation(kind):
+    """Shared body of the generation routes: validates the JSON body against its schema, then enqueues, streams or runs the generation."""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided in request."}), 400
+    try:
+        form = REQUEST_SCHEMAS[kind].model_validate(data)
+    except ValidationError as e:
+        return jsonify({"error": describe_validation_error(e)}), 400
+    if celery:
+        job = generate_content_task.apply_async(
+            (form.model_dump(), kind), task_id=_new_job_id(), expires=JOB_TIMEOUT_SECONDS
+        )
+        return jsonify({"job_id": job.id}), 202
+    if request.accept_mimetypes.best == 'text/event-stream':
+        return await stream_generation(kind, form)
+    payload, status = await GENERATION_RUNNERS[kind](form)
+    return jsonify(payload), status
+
+
+# --- Flask Routes ---
+
+@functools.cache
+def _rendered_index():
+    return render_template('index.html')
+
+
+@app.route('/')
+def index():
+    """Serves the main HTML page, rendered once per process unless in debug mode."""
+    if app.debug:
+        return render_template('index.html')
+    return _rendered_index()
+
+@app.route('/generate_local_biz_captions', methods=['POST'])
+async def generate_local_biz_captions():
+    """Handles form submission for local businesses, interacts with Gemini API, and returns generated captions."""
+    return await respond_with_generation('local_biz')
+
+
+# --- NEW: Flask Route for Artisan Product Descriptions ---
+@app.route('/generate_artisan_description', methods=['POST'])
+async def generate_artisan_description():
+    """Handles form submission for artisan product descriptions, interacts with Gemini API, and returns generated descriptions."""
+    return await respond_with_generation('artisan')
+
+
+@app.route('/result/<job_id>')
+def generation_result(job_id):
+    """Reports the state of a background generation job, with its payload once finished."""
+    if not celery:
+        return jsonify({"error": "Background jobs are not enabled."}), 404
+    job_age = _job_age(job_id)
+    if job_age is None:
+        return jsonify({"error": "Unknown job."}), 404
+    result = celery.AsyncResult(job_id)
+    if result.successful():
+        payload, status = result.get()
+        return jsonify({"status": "done", **payload}), status
+    if result.ready():
+        log.error("Generation job %s ended in %s: %s", job_id, result.state, result.result)
+        return jsonify({"status": "failed", "error": "An internal error occurred. Please try again."}), 500
+    if job_age > JOB_TIMEOUT_SECONDS:
+        log.warning("Generation job %s still pending after %ds", job_id, job_age)
+        return jsonify({"status": "failed", "error": "The AI took too long to respond. Please try again."}), 504
+    return jsonify({"status": "pending"})
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Development server only; set FLASK_DEBUG=1 for the debugger and template reloading.
+    app.run(debug=os.getenv("FLASK_DEBUG") == "1", port=5000)
@@ -0,0 +1,31 @@
+"""Stand-ins for the Gemini SDK's response objects and models, shaped like what app.py reads."""
+import json
+from types import SimpleNamespace
+
+
+def fake_candidate(text):
+    """A candidate whose first part holds text; None gives a candidate with no parts (e.g. blocked)."""
+    parts = [] if text is None else [SimpleNamespace(text=text)]
+    return SimpleNamespace(content=SimpleNamespace(parts=parts))
+
+
+def fake_response(*texts):
+    """A GenerateContentResponse with one candidate per raw text."""
+    return SimpleNamespace(candidates=[fake_candidate(text) for text in texts], prompt_feedback=None)
+
+
+def json_response(*values):
+    """A response with one candidate per value, each serialized as JSON."""
+    return fake_response(*(json.dumps(value) for value in values))
+
+
+class FakeModel:
+    """Records generate_content_async calls and answers each with reply(prompt, generation_config)."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+        self.calls.append((prompt, generation_config or {}))
+        return await self.reply(prompt, generation_config or {})
@@ -0,0 +1,17 @@
+import unittest
+
+from app import _job_age, _new_job_id
+
+
+class JobAgeTest(unittest.TestCase):
+    def test_new_job_id_is_fresh(self):
+        self.assertLess(_job_age(_new_job_id()), 5)
+
+    def test_ids_not_issued_by_the_app_are_unknown(self):
+        for job_id in ("bogus", "-abc", "²-abc", "٣-abc", " 12-abc", "+12-abc", "1_000-abc"):
+            with self.subTest(job_id=job_id):
+                self.assertIsNone(_job_age(job_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from app import parse_candidate_items
+from tests.fakes import fake_response, json_response
+
+
+class ParseCandidateItemsTest(unittest.TestCase):
+    def test_one_item_per_candidate(self):
+        response = json_response("  First caption. ", "Second caption.")
+        self.assertEqual(parse_candidate_items(response), ["First caption.", "Second caption."])
+
+    def test_keeps_line_breaks_inside_an_item(self):
+        response = json_response("Para one.\n\nPara two.", "Second description.")
+        self.assertEqual(parse_candidate_items(response), ["Para one.\n\nPara two.", "Second description."])
+
+    def test_off_schema_array_stays_one_item(self):
+        response = json_response(["Para one.", " ", "Para two."], "Second description.")
+        self.assertEqual(parse_candidate_items(response), ["Para one.\n\nPara two.", "Second description."])
+
+    def test_skips_blocked_malformed_and_empty_candidates(self):
+        response = fake_response(None, "not json", '"   "', '""', '"kept"')
+        with self.assertLogs("app", level="WARNING"):
+            self.assertEqual(parse_candidate_items(response), ["kept"])
+
+    def test_skips_json_that_is_not_a_string(self):
+        response = fake_response("42", "null", '{"caption": "x"}', "[1, 2]", '"kept"')
+        self.assertEqual(parse_candidate_items(response), ["kept"])
+
+
+if __name__ == "__main__":
+    unittest.main()
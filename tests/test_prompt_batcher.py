@@ -0,0 +1,96 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import app
+from app import PromptBatcher
+from tests.fakes import fake_response, json_response, FakeModel
+
+
+def submit_all(batcher, *requests):
+    """Submits (prompt, num_variations) pairs concurrently and returns each one's result or exception."""
+    async def run():
+        return await asyncio.gather(
+            *(batcher.submit(prompt, n) for prompt, n in requests), return_exceptions=True
+        )
+    return asyncio.run(run())
+
+
+def batched_reply(*arrays):
+    """Replies to a batched prompt with one candidate holding the given JSON."""
+    async def reply(prompt, generation_config):
+        if "response_schema" not in generation_config:
+            raise AssertionError("expected a batched call")
+        return json_response(list(arrays))
+    return reply
+
+
+class PromptBatcherTest(unittest.TestCase):
+    def batcher(self, reply, max_batch=8):
+        # Long enough for every submit in a test to join one batch.
+        batcher = PromptBatcher(FakeModel(reply), max_output_tokens=100, max_batch=max_batch, max_wait=0.2)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_lone_prompt_uses_candidates(self):
+        async def reply(prompt, generation_config):
+            return json_response(*[f"{prompt} {i}" for i in range(generation_config["candidate_count"])])
+        batcher = self.batcher(reply)
+        self.assertEqual(submit_all(batcher, ("p", 2)), [["p 0", "p 1"]])
+        self.assertEqual(batcher.model.calls, [("p", {"candidate_count": 2})])
+
+    def test_concurrent_prompts_share_one_call(self):
+        batcher = self.batcher(batched_reply(["a1", "a2", "a3"], ["b1"], ["c1", "c2"]))
+        results = submit_all(batcher, ("first", 2), ("second", 1), ("third", 2))
+        self.assertEqual(results, [["a1", "a2"], ["b1"], ["c1", "c2"]])
+        self.assertEqual(len(batcher.model.calls), 1)
+        prompt, generation_config = batcher.model.calls[0]
+        self.assertLess(prompt.index("[1]"), prompt.index("first"))
+        self.assertLess(prompt.index("[3]"), prompt.index("third"))
+        self.assertEqual(generation_config["max_output_tokens"], 500)
+
+    def test_max_batch_splits_calls(self):
+        batcher = self.batcher(batched_reply(["x"], ["y"]), max_batch=2)
+        results = submit_all(batcher, ("a", 1), ("b", 1), ("c", 1), ("d", 1))
+        self.assertEqual(results, [["x"], ["y"], ["x"], ["y"]])
+        self.assertEqual(len(batcher.model.calls), 2)
+
+    def test_short_reply_leaves_later_requests_empty(self):
+        batcher = self.batcher(batched_reply([" a1 ", ""]))
+        self.assertEqual(submit_all(batcher, ("first", 1), ("second", 1)), [["a1"], []])
+
+    def test_non_list_entries_are_empty(self):
+        batcher = self.batcher(batched_reply("not a list", ["b1"]))
+        self.assertEqual(submit_all(batcher, ("first", 1), ("second", 1)), [[], ["b1"]])
+
+    def test_invalid_json_reply_leaves_every_request_empty(self):
+        async def reply(prompt, generation_config):
+            return fake_response('[["a1"], ["b')
+        batcher = self.batcher(reply)
+        with self.assertLogs("app", level="WARNING"):
+            self.assertEqual(submit_all(batcher, ("first", 1), ("second", 1)), [[], []])
+
+    def test_failed_call_fails_every_request(self):
+        async def reply(prompt, generation_config):
+            raise RuntimeError("quota exceeded")
+        results = submit_all(self.batcher(reply), ("first", 1), ("second", 1))
+        self.assertEqual([type(result) for result in results], [RuntimeError, RuntimeError])
+
+    def test_stalled_call_times_out_for_every_request(self):
+        async def reply(prompt, generation_config):
+            await asyncio.sleep(5)
+        batcher = self.batcher(reply)
+        with mock.patch.object(app, "GEMINI_TIMEOUT_SECONDS", 0.5):
+            results = submit_all(batcher, ("first", 1), ("second", 1))
+            self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in results))
+            # The callers' own timeouts started before the batch was sent; the shared call's
+            # timeout follows within max_wait and cancels it instead of leaving it running.
+            deadline = time.monotonic() + 1
+            while batcher._answering and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertEqual(batcher._answering, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
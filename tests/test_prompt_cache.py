@@ -0,0 +1,125 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import app
+from app import PromptCache
+from tests.fakes import FakeModel, json_response
+
+
+def unit(*values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class ExactTierTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = PromptCache(maxsize=2)
+
+    def lookup(self, prompt, num_variations):
+        return asyncio.run(self.cache.lookup(prompt, num_variations))
+
+    def test_miss_then_hit(self):
+        items, key = self.lookup("prompt", 2)
+        self.assertIsNone(items)
+        self.cache.store(key, 2, ["a", "b"])
+        self.assertEqual(self.lookup("prompt", 2)[0], ["a", "b"])
+
+    def test_variation_count_is_part_of_the_key(self):
+        _, key = self.lookup("prompt", 2)
+        self.cache.store(key, 2, ["a", "b"])
+        self.assertIsNone(self.lookup("prompt", 3)[0])
+
+    def test_evicts_least_recently_used(self):
+        for prompt in ("a", "b"):
+            _, key = self.lookup(prompt, 1)
+            self.cache.store(key, 1, [prompt])
+        self.lookup("a", 1) # Refreshes "a", leaving "b" oldest
+        _, key = self.lookup("c", 1)
+        self.cache.store(key, 1, ["c"])
+        self.assertEqual(self.lookup("a", 1)[0], ["a"])
+        self.assertIsNone(self.lookup("b", 1)[0])
+        self.assertEqual(self.lookup("c", 1)[0], ["c"])
+
+
+class SemanticTierTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = PromptCache(maxsize=16, semantic_threshold=0.9, semantic_size=2)
+        self.vectors = {}
+
+        async def embed(prompt):
+            return self.vectors.get(prompt)
+        self.cache._embed = embed
+
+    def lookup(self, prompt, num_variations):
+        return asyncio.run(self.cache.lookup(prompt, num_variations))
+
+    def remember(self, prompt, vector, num_variations, items):
+        self.vectors[prompt] = vector
+        _, key = self.lookup(prompt, num_variations)
+        self.cache.store(key, num_variations, items)
+
+    def test_similar_prompt_with_same_variation_count_hits(self):
+        self.remember("cafe, friendly", unit(1, 0, 0), 2, ["a", "b"])
+        self.vectors["cafe, friendly!"] = unit(1, 0.1, 0)
+        self.assertEqual(self.lookup("cafe, friendly!", 2)[0], ["a", "b"])
+
+    def test_similar_prompt_with_other_variation_count_misses(self):
+        self.remember("cafe, friendly", unit(1, 0, 0), 2, ["a", "b"])
+        self.vectors["cafe, friendly!"] = unit(1, 0.1, 0)
+        self.assertIsNone(self.lookup("cafe, friendly!", 3)[0])
+
+    def test_similar_prompt_from_the_other_family_misses(self):
+        # Every prompt embeds identically, so only the per-family caches keep them apart.
+        async def embed(prompt):
+            return unit(1, 0, 0)
+        caches = {kind: PromptCache(maxsize=16, semantic_threshold=0.5) for kind in app.MODEL_SETTINGS}
+        for cache in caches.values():
+            cache._embed = embed
+
+        async def reply(prompt, generation_config):
+            return json_response(*[prompt] * generation_config["candidate_count"])
+        model = FakeModel(reply)
+        with (
+            mock.patch.object(app, "prompt_caches", caches),
+            mock.patch.object(app, "get_model", lambda kind: model),
+            mock.patch.object(app, "get_batcher", lambda kind: None),
+        ):
+            captions, _ = asyncio.run(app.run_local_biz_generation(app.LocalBizRequest(num_variations=2)))
+            descriptions, _ = asyncio.run(app.run_artisan_generation(app.ArtisanRequest(num_variations=2)))
+        self.assertEqual(len(model.calls), 2)
+        self.assertIn("business type", captions["captions"][0])
+        self.assertIn("The product is", descriptions["descriptions"][0])
+
+    def test_picks_the_most_similar_entry_with_matching_count(self):
+        self.remember("near", unit(1, 0.05, 0), 3, ["near, 3"])
+        self.remember("nearer", unit(1, 0.02, 0), 2, ["nearer, 2"])
+        self.vectors["query"] = unit(1, 0, 0)
+        self.assertEqual(self.lookup("query", 3)[0], ["near, 3"])
+
+    def test_dissimilar_prompt_misses(self):
+        self.remember("cafe", unit(1, 0, 0), 2, ["a", "b"])
+        self.vectors["bakery"] = unit(0, 1, 0)
+        self.assertIsNone(self.lookup("bakery", 2)[0])
+
+    def test_oldest_vector_is_overwritten_when_full(self):
+        self.remember("first", unit(1, 0, 0), 1, ["first"])
+        self.remember("second", unit(0, 1, 0), 1, ["second"])
+        self.remember("third", unit(0, 0, 1), 1, ["third"])
+        self.vectors["like first"] = unit(1, 0.01, 0)
+        self.vectors["like third"] = unit(0, 0.01, 1)
+        self.assertIsNone(self.lookup("like first", 1)[0])
+        self.assertEqual(self.lookup("like third", 1)[0], ["third"])
+
+    def test_failed_embedding_falls_back_to_exact_match(self):
+        _, key = self.lookup("unembeddable", 1)
+        self.assertIsNone(key[1])
+        self.cache.store(key, 1, ["x"])
+        self.assertEqual(self.lookup("unembeddable", 1)[0], ["x"])
+        self.assertIsNone(self.lookup("other", 1)[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
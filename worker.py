@@ -0,0 +1,13 @@
+"""Background job worker entry point: `celery -A worker.celery worker --pool=threads`.
+
+Only scale the Procfile's worker process above 0 when GENERATION_BACKGROUND_JOBS=1 and
+REDIS_URL are set for both processes; otherwise the web process generates in the request
+and this worker refuses to start.
+"""
+import sys
+
+from app import celery
+
+if celery is None:
+    sys.exit("Background jobs are disabled: set GENERATION_BACKGROUND_JOBS=1 and REDIS_URL, "
+             "or scale the worker process to 0.")
@@ -0,0 +1,21 @@
+"""Production entry point: serve `wsgi:application` with a threaded WSGI server.
+
+Generation requests spend nearly all their time waiting on Gemini, so each server
+thread is mostly idle and many can run per core. The Procfile runs waitress with
+WEB_THREADS threads (default 16) in one process:
+
+    waitress-serve --host=0.0.0.0 --port=$PORT --threads=16 wsgi:application
+
+On Linux hosts, gunicorn's threaded worker adds one process per core on top of that:
+
+    gunicorn -k gthread -w $(nproc) --threads 16 wsgi:application
+
+Each process keeps its own Gemini loop, channel and prompt cache. `app.run()` in
+app.py is the single-threaded development server and should not be used here.
+
+The Procfile's `worker` process runs background jobs (see worker.py). Keep it scaled
+to 0 unless GENERATION_BACKGROUND_JOBS=1 and REDIS_URL are set.
+"""
+from app import app
+
+application = app